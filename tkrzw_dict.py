@@ -13,6 +13,7 @@
 # and limitations under the License.
 #--------------------------------------------------------------------------------------------------
 
+import functools
 import importlib
 import logging
 import math
@@ -143,14 +144,12 @@ def NormalizeWord(text):
   return RemoveDiacritic(text.lower()).strip()
 
 
-_regex_numeric_word = re.compile(r"^[-0-9.]+$")
+_numeric_word_chars = "-0123456789."
 def IsNumericWord(word):
-  if _regex_numeric_word.search(word):
-    return True
-  return False
+  return bool(word) and not word.strip(_numeric_word_chars)
 
 
-_regex_stop_word_num = re.compile(r"[0-9]")
+_set_stop_word_digits = frozenset("0123456789")
 _set_en_stop_words = set(("the", "a", "an", "be", "do", "not", "and", "or", "but",
                           "no", "any", "some", "this", "these", "that", "those",
                           "i", "my", "me", "mine", "you", "your", "yours", "we", "our", "us", "ours",
@@ -159,16 +158,17 @@ _set_en_stop_words = set(("the", "a", "an", "be", "do", "not", "and", "or", "but
 _regex_stop_word_ja_hiragana = regex.compile(r"^[\p{Hiragana}ー]+$")
 _regex_stop_word_ja_date = re.compile(r"^[年月日]*$")
 _regex_stop_word_ja_latin = regex.compile(r"[\p{Latin}]")
+@functools.lru_cache(maxsize=65536)
 def IsStopWord(language, word):
-  if _regex_stop_word_num.search(word):
+  if not _set_stop_word_digits.isdisjoint(word):
     return True
   if language == "en":
     if word in _set_en_stop_words:
       return True
   if language == "ja":
-    if _regex_stop_word_ja_hiragana.search(word):
+    if _regex_stop_word_ja_hiragana.match(word):
       return True
-    if _regex_stop_word_ja_date.search(word):
+    if _regex_stop_word_ja_date.match(word):
       return True
     if _regex_stop_word_ja_latin.search(word):
       return True
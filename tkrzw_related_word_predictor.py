@@ -13,8 +13,11 @@
 # and limitations under the License.
 #--------------------------------------------------------------------------------------------------
 
+import collections
+import heapq
 import math
 import operator
+import sys
 import tkrzw
 import tkrzw_dict
 import tkrzw_tokenizer
@@ -25,6 +28,7 @@ class RelatedWordsPredictor:
   CHECK_COOC_WORDS = 16
   CHECK_REL_WORDS = 128
   NUM_FEATURES = 256
+  COOC_CACHE_CAPACITY = 100000
 
   def __init__(self, data_prefix, language):
     self.language = language
@@ -32,6 +36,7 @@ class RelatedWordsPredictor:
     word_score_path = tkrzw_dict.GetCoocScorePath(data_prefix);
     self.word_score_dbm = tkrzw.DBM()
     self.word_score_dbm.Open(word_score_path, False, dbm="HashDBM").OrDie()
+    self.cooc_cache = {}
 
   def __del__(self):
     self.word_score_dbm.Close().OrDie()
@@ -40,21 +45,26 @@ class RelatedWordsPredictor:
     words = set(self.tokenizer.Tokenize(self.language, text, True, False))
     if len(words) > 1:
       words.add(tkrzw_dict.NormalizeWord(text))
-    cooc_words = {}
-    for word in words:
-      for cooc_word, cooc_score in self.GetCoocWords(word):
-        cooc_words[cooc_word] = (cooc_words.get(cooc_word) or 0) + cooc_score
-    sorted_cooc_words = sorted(cooc_words.items(), key=operator.itemgetter(1), reverse=True)
-    rel_words = {}
-    num_traces = 0
+    cooc_words = collections.defaultdict(float)
+    for word_cooc_words in self.GetCoocWordsMulti(words).values():
+      for cooc_word, cooc_score in word_cooc_words.items():
+        cooc_words[cooc_word] += cooc_score
+    num_cooc_words = max(self.TRACE_COOC_WORDS, self.CHECK_COOC_WORDS, self.NUM_FEATURES)
+    sorted_cooc_words = heapq.nlargest(
+      num_cooc_words + len(words), cooc_words.items(), key=operator.itemgetter(1))
+    trace_words = []
     for cooc_word, cooc_score in sorted_cooc_words:
-      if num_traces >= self.TRACE_COOC_WORDS: break
+      if len(trace_words) >= self.TRACE_COOC_WORDS: break
       if cooc_word in words: continue
-      for rel_word, rel_score in self.GetCoocWords(cooc_word):
+      trace_words.append((cooc_word, cooc_score))
+    trace_cooc_words = self.GetCoocWordsMulti([x[0] for x in trace_words])
+    rel_words = {}
+    for cooc_word, cooc_score in trace_words:
+      for rel_word, rel_score in trace_cooc_words[cooc_word].items():
         if rel_word in words: continue
-        rel_words[rel_word] = max(rel_words.get(rel_word) or 0, cooc_score * rel_score)
-      num_traces += 1
-    sorted_rel_words = sorted(rel_words.items(), key=operator.itemgetter(1), reverse=True)
+        rel_score *= cooc_score
+        if rel_score >= rel_words.get(rel_word, 0.0):
+          rel_words[rel_word] = rel_score
     check_words = set(words)
     num_cooc_checked = 0
     for cooc_word, _ in sorted_cooc_words:
@@ -62,65 +72,111 @@ class RelatedWordsPredictor:
       if cooc_word in check_words: continue
       check_words.add(cooc_word)
       num_cooc_checked += 1
+    sorted_rel_words = heapq.nlargest(
+      self.CHECK_REL_WORDS + len(check_words), rel_words.items(), key=operator.itemgetter(1))
     num_rel_checked = 0
     for rel_word, _ in sorted_rel_words:
       if num_rel_checked >= self.CHECK_REL_WORDS: break
       if rel_word in check_words: continue
       check_words.add(rel_word)
       num_rel_checked += 1
+    seed_cooc_words = sorted_cooc_words[:self.NUM_FEATURES]
+    seed_index = {word: i for i, (word, _) in enumerate(seed_cooc_words)}
+    seed_norm = 0.0
+    for _, seed_score in seed_cooc_words:
+      seed_norm += seed_score ** 2
+    seed_norm = seed_norm ** 0.5
     scored_rel_words = []
-    for rel_word in check_words:
-      rel_cooc_words = self.GetCoocWords(rel_word)
-      score = self.GetSimilarity(sorted_cooc_words, rel_cooc_words)
+    for rel_word, rel_cooc_map in self.GetCoocWordsMulti(check_words).items():
+      score = self.GetSimilarity(seed_cooc_words, seed_index, seed_norm, rel_cooc_map)
       scored_rel_words.append((rel_word, score))
-    scored_rel_words = sorted(scored_rel_words, key=operator.itemgetter(1), reverse=True)
+    scored_rel_words.sort(key=operator.itemgetter(1), reverse=True)
     return scored_rel_words, sorted_cooc_words
 
+  # The returned maps are shared with the cache and must not be modified by callers.
   def GetCoocWords(self, word):
-    cooc_words = []
-    tsv = self.word_score_dbm.GetStr(word)
+    cooc_words = self.cooc_cache.get(word)
+    if cooc_words is None:
+      cooc_words = self.ParseCoocWords(word, self.word_score_dbm.GetStr(word))
+      self.AddCoocCache(word, cooc_words)
+    return cooc_words
+
+  def GetCoocWordsMulti(self, words):
+    result = {}
+    missing_words = []
+    for word in words:
+      cooc_words = self.cooc_cache.get(word)
+      if cooc_words is None:
+        missing_words.append(word)
+      result[word] = cooc_words
+    if missing_words:
+      records = self.word_score_dbm.GetMultiStr(*missing_words)
+      for word in missing_words:
+        cooc_words = self.ParseCoocWords(word, records.get(word))
+        self.AddCoocCache(word, cooc_words)
+        result[word] = cooc_words
+    return result
+
+  def AddCoocCache(self, word, cooc_words):
+    if len(self.cooc_cache) >= self.COOC_CACHE_CAPACITY:
+      del self.cooc_cache[next(iter(self.cooc_cache))]
+    self.cooc_cache[word] = cooc_words
+
+  def ParseCoocWords(self, word, tsv):
+    cooc_words = {}
     if not tsv: return cooc_words
-    fields = tsv.split("\t")
+    fields = tsv.replace("\t", " ").split(" ")
     idf = int(fields[0])
-    score = tkrzw_dict.MAX_PROB_SCORE * idf * idf / (tkrzw_dict.COOC_BASE_SCORE ** 2)
-    if tkrzw_dict.IsNumericWord(word):
-      score *= tkrzw_dict.NUMERIC_WORD_WEIGHT
-    elif tkrzw_dict.IsStopWord(self.language, word):
-      score *= tkrzw_dict.STOP_WORD_WEIGHT
-    cooc_words.append((word, score))
-    for field in fields[1:]:
-      cooc_word, cooc_score = field.split(" ")
-      cooc_score = int(cooc_score) * idf / (tkrzw_dict.COOC_BASE_SCORE ** 2)
-      if tkrzw_dict.IsNumericWord(cooc_word):
-        cooc_score *= tkrzw_dict.NUMERIC_WORD_WEIGHT
-      elif tkrzw_dict.IsStopWord(self.language, cooc_word):
-        cooc_score *= tkrzw_dict.STOP_WORD_WEIGHT
-      cooc_words.append((cooc_word, cooc_score))
+    base_divisor = tkrzw_dict.COOC_BASE_SCORE ** 2
+    get_weight = self.GetWordWeight
+    score = tkrzw_dict.MAX_PROB_SCORE * idf * idf / base_divisor * get_weight(word)
+    cooc_words[word] = score
+    for cooc_word, cooc_score in zip(fields[1::2], fields[2::2]):
+      cooc_score = int(cooc_score) * idf / base_divisor * get_weight(cooc_word)
+      cooc_words[sys.intern(cooc_word)] = cooc_score
     return cooc_words
 
+  def GetWordWeight(self, word):
+    if tkrzw_dict.IsNumericWord(word):
+      return tkrzw_dict.NUMERIC_WORD_WEIGHT
+    if tkrzw_dict.IsStopWord(self.language, word):
+      return tkrzw_dict.STOP_WORD_WEIGHT
+    return 1.0
+
   def GetSoftMax(self, scored_words):
+    exps = [(word, math.exp(score)) for word, score in scored_words]
     sum = 0.0
-    for word, score in scored_words:
-      sum += math.exp(score)
+    for _, exp in exps:
+      sum += exp
     result = {}
     if sum == 0:
-      for word, score in scored_words:
+      for word, _ in exps:
         result[word] = 0.0
     else:
-      for word, score in scored_words:
-        result[word] = math.exp(score) / sum
+      for word, exp in exps:
+        result[word] = exp / sum
     return result
 
-  def GetSimilarity(self, seed_cooc_words, rel_cooc_words):
-    rel_cooc_map = dict(rel_cooc_words)
-    seed_norm, rel_norm = 0.0, 0.0
+  def GetSimilarity(self, seed_cooc_words, seed_index, seed_norm, rel_cooc_map):
+    if seed_norm == 0: return 0.0
+    if len(rel_cooc_map) < len(seed_cooc_words):
+      indices = []
+      for word in rel_cooc_map:
+        index = seed_index.get(word)
+        if index is not None:
+          indices.append(index)
+      indices.sort()
+      shared_words = [seed_cooc_words[i] for i in indices]
+    else:
+      shared_words = seed_cooc_words
+    rel_norm = 0.0
     product = 0.0
-    for word, seed_score in seed_cooc_words[:self.NUM_FEATURES]:
-      rel_score = rel_cooc_map.get(word) or 0.0
+    for word, seed_score in shared_words:
+      rel_score = rel_cooc_map.get(word)
+      if rel_score is None: continue
       product += seed_score * rel_score
-      seed_norm += seed_score ** 2
       rel_norm += rel_score ** 2
-    if seed_norm == 0 or rel_norm == 0: return 0.0
-    score = min(product / ((seed_norm ** 0.5) * (rel_norm ** 0.5)), 1.0)
+    if rel_norm == 0: return 0.0
+    score = min(product / (seed_norm * (rel_norm ** 0.5)), 1.0)
     if score >= 0.99999: score = 1.0
     return score
@@ -165,9 +165,8 @@ class UnionSearcher:
           for j, rel_word in enumerate(tmp_rel_words):
             rel_words.append((rel_word, i + j))
       if rel_words:
-        rel_words = sorted(rel_words, key=lambda x: x[1])
-        rel_words = [x[0] for x in rel_words]
-        for rel_word in rel_words[:max_rel_words]:
+        rel_words = heapq.nsmallest(max_rel_words, rel_words, key=operator.itemgetter(1))
+        for rel_word, _ in rel_words:
           if len(checked_words) >= capacity: break
           if rel_word in checked_words: continue
           for child in self.SearchExact(rel_word, capacity - len(checked_words)):
@@ -215,6 +214,8 @@ class UnionSearcher:
             num_appends += 1
     return result
 
+  re_feature_tran_suffix = regex.compile(
+    r"([\p{Han}\p{Katakana}ー]{2,})(する|すること|される|されること|をする|な|に|さ)$")
   def GetFeatures(self, entry):
     SCORE_DECAY = 0.95
     word = tkrzw_dict.NormalizeWord(entry["word"])
@@ -224,7 +225,7 @@ class UnionSearcher:
     pos_features = collections.defaultdict(float)
     for item in entry["item"]:
       pos = "__" + item["pos"]
-      new_score = (pos_features.get(pos) or 0.0) + pos_score
+      new_score = pos_features[pos] + pos_score
       pos_features[pos] = new_score
       pos_score_max = max(pos_score_max, new_score)
       pos_score *= SCORE_DECAY
@@ -242,9 +243,7 @@ class UnionSearcher:
     if trans:
       for tran in trans[:20]:
         tran = tkrzw_dict.NormalizeWord(tran)
-        tran = regex.sub(
-          r"([\p{Han}\p{Katakana}ー]{2,})(する|すること|される|されること|をする|な|に|さ)$",
-          r"\1", tran)
+        tran = self.re_feature_tran_suffix.sub(r"\1", tran)
         if tran not in features:
           score *= SCORE_DECAY
           features[tran] = score